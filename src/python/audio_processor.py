@@ -1,7 +1,11 @@
+import logging
+from bisect import bisect_left, bisect_right
 import numpy as np
 import soundfile as sf
 import sounddevice as sd
-import librosa
+from downsample import abs_peak
+
+logger = logging.getLogger(__name__)
 
 class WavAudioProcessor:
     def __init__(self,
@@ -15,9 +19,11 @@ class WavAudioProcessor:
                                 int(self.total_time * self.sample_rate))
         self.data = np.random.normal(0,
                                      0.1,
-                                     int(self.total_time * self.sample_rate))
+                                     int(self.total_time * self.sample_rate)).astype(np.float32)
+        self.peak = abs_peak(self.data)
         #self.segments = [0, len(self.data) - 1]
         self.segments = []
+        self.onset_env = None
 
     def set_filename(self, filename: str):
         self.filename = filename
@@ -26,16 +32,21 @@ class WavAudioProcessor:
             self.total_time = len(sound_file) / self.sample_rate
         self.time = np.linspace(0, self.total_time, int(self.total_time * self.sample_rate))
         self.data = self._generate_data()
+        self.peak = abs_peak(self.data)
         #self.segments = [0, len(self.data) - 1]
         self.segments = []
+        self.onset_env = None
 
     def _generate_data(self) -> np.ndarray:
-        audio_data, _ = sf.read(self.filename, always_2d=True)
+        # Decode straight to float32: every downstream scan (y-limits,
+        # onset detection, playback) is memory bound, so halving the
+        # element size halves the bytes they walk
+        audio_data, _ = sf.read(self.filename, dtype='float32', always_2d=True)
         if audio_data.shape[1] > 1:
-            audio_data = np.mean(audio_data, axis=1)
+            audio_data = np.mean(audio_data, axis=1, dtype=np.float32)
         else:
-            audio_data = audio_data.flatten()
-        return audio_data
+            audio_data = audio_data[:, 0]
+        return np.ascontiguousarray(audio_data)
 
     def get_data(self, start_time: float, end_time: float) -> tuple[np.ndarray, np.ndarray]:
         start_idx = int(start_time * self.sample_rate)
@@ -56,11 +67,17 @@ class WavAudioProcessor:
         return self.segments
 
     def split_by_transients(self, threshold=0.2):
-        print(f"split_by_transients: {threshold}")
+        logger.debug("split_by_transients: %s", threshold)
+        # librosa pulls in numba, scipy and scikit-learn; defer that cost until
+        # transient detection is actually used instead of paying it at startup
+        import librosa
         delta = threshold * 0.1
-        onset_env = librosa.onset.onset_strength(y=self.data, sr=self.sample_rate)
+        # The onset strength envelope (an STFT over the whole file) depends
+        # only on the audio, not on the threshold; compute it once per file
+        if self.onset_env is None:
+            self.onset_env = librosa.onset.onset_strength(y=self.data, sr=self.sample_rate)
         onsets = librosa.onset.onset_detect(
-            onset_envelope=onset_env, 
+            onset_envelope=self.onset_env,
             sr=self.sample_rate,
             delta=delta,
             wait=1,
@@ -72,18 +89,23 @@ class WavAudioProcessor:
         return self.segments
 
     def remove_segment(self, click_time):
-        print(f"remove_segment {click_time}")
-        print(f"remove_segment {self.segments}")
+        logger.debug("remove_segment %s", click_time)
+        logger.debug("remove_segment %s", self.segments)
         if not self.segments:
             return
         click_sample = int(click_time * self.sample_rate)
-        print(f"remove_segment {click_sample}")
-        closest_index = min(range(len(self.segments)),
-                            key=lambda i: abs(self.segments[i] - click_sample))
+        logger.debug("remove_segment %s", click_sample)
+        # Segments are kept sorted, so the closest one is a neighbour of the
+        # insertion point; ties go to the earlier segment
+        closest_index = bisect_left(self.segments, click_sample)
+        if closest_index == len(self.segments) or (
+                closest_index > 0 and
+                click_sample - self.segments[closest_index - 1] <= self.segments[closest_index] - click_sample):
+            closest_index -= 1
         del self.segments[closest_index]
 
     def add_segment(self, click_time):
-        print(f"remove_segment {click_time}")
+        logger.debug("add_segment %s", click_time)
         new_segment = int(click_time * self.sample_rate)
         self.segments.append(new_segment)
         self.segments.sort()
@@ -94,12 +116,12 @@ class WavAudioProcessor:
     def get_segment_boundaries(self, click_time):
         click_sample = int(click_time * self.sample_rate)
         segments = self.get_segments()
-        for i, segment in enumerate(segments):
-            if click_sample < segment:
-                if i == 0:
-                    return 0, segment / self.sample_rate
-                else:
-                    return segments[i-1] / self.sample_rate, segment / self.sample_rate
+        # Segments are kept sorted; bisect for the first one after the click
+        i = bisect_right(segments, click_sample)
+        if i < len(segments):
+            if i == 0:
+                return 0, segments[i] / self.sample_rate
+            return segments[i-1] / self.sample_rate, segments[i] / self.sample_rate
         if segments:
             return segments[-1] / self.sample_rate, len(self.data) / self.sample_rate
         else:
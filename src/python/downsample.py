@@ -0,0 +1,37 @@
+import numpy as np
+
+def peak_envelope(time, data, num_buckets):
+    """
+    Reduce a waveform to num_buckets columns using M4 aggregation.
+
+    Each run of consecutive samples contributes its first, minimum, maximum
+    and last sample, in time order, so a line through the result is
+    indistinguishable from the raw samples at one bucket per pixel column.
+    Trailing samples that do not fill a whole bucket (less than one column)
+    are dropped. Data that is already small enough is returned unchanged.
+    """
+    bucket_size = len(data) // num_buckets
+    if bucket_size < 4:
+        return time, data
+    n = bucket_size * num_buckets
+    buckets = data[:n].reshape(num_buckets, bucket_size)
+    picks = np.empty((num_buckets, 4), dtype=np.intp)
+    picks[:, 0] = 0
+    picks[:, 1] = buckets.argmin(axis=1)
+    picks[:, 2] = buckets.argmax(axis=1)
+    picks[:, 3] = bucket_size - 1
+    picks.sort(axis=1)
+    picks += np.arange(0, n, bucket_size)[:, np.newaxis]
+    indices = picks.ravel()
+    return time[indices], data[indices]
+
+def abs_peak(data):
+    """
+    Return the largest absolute sample value in data.
+
+    Computed from min and max rather than np.abs(data).max(), which would
+    write a full-size temporary array and read it back again.
+    """
+    if len(data) == 0:
+        return 0.0
+    return max(-float(data.min()), float(data.max()))
@@ -1,6 +1,7 @@
 # export_utils.py
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 import soundfile as sf
 from midiutil import MIDIFile
 
@@ -25,18 +26,15 @@ class MIDIFileWithMetadata(MIDIFile):
 
 class ExportUtils:
     @staticmethod
-    def export_segments(model, tempo, num_bars, directory):
-        segments = model.get_segments()
-        audio_data = model.data
-        sample_rate = model.sample_rate
+    def export_segments(segments, audio_data, sample_rate, tempo, directory):
+        # Called on a worker thread, so it works on the caller's snapshot of
+        # the segments and audio rather than on the live model
         total_duration = len(audio_data) / sample_rate
-        tempo = model.get_tempo(num_bars)
 
         print(f"Debug: Total duration: {total_duration} seconds")
         print(f"Debug: Tempo: {tempo} BPM")
         print(f"Debug: Number of segments: {len(segments)}")
 
-        sfz_content = []
         midi = MIDIFileWithMetadata(1)  # One track
         midi.addTempo(0, 0, tempo)
         midi.addTimeSignature(0, 0, 4, 4, 24, 8)  # Assuming 4/4 time signature
@@ -46,32 +44,46 @@ class ExportUtils:
             segments.insert(0, 0)
         if segments[-1] != len(audio_data):
             segments.append(len(audio_data))
+        bounds = list(zip(segments[:-1], segments[1:]))
 
         # Calculate beats per second
         beats_per_second = tempo / 60
 
-        for i, (start, end) in enumerate(zip(segments[:-1], segments[1:])):
-            # Export audio segment
-            segment_data = audio_data[start:end]
-            segment_filename = f"segment_{i+1}.wav"
-            segment_path = os.path.join(directory, segment_filename)
-            sf.write(segment_path, segment_data, sample_rate)
-
-            # Add to SFZ content
-            sfz_content.append(f"""
+        # Segment files are independent and libsndfile releases the GIL while
+        # writing, so write them on a pool; slicing is a view, so no copy is
+        # made. Wait for all of them, re-raising any write error, before the
+        # SFZ file is written so a failed export never leaves an instrument
+        # pointing at missing samples
+        with ThreadPoolExecutor() as executor:
+            writes = [executor.submit(sf.write,
+                                      os.path.join(directory, f"segment_{i+1}.wav"),
+                                      audio_data[start:end], sample_rate)
+                      for i, (start, end) in enumerate(bounds)]
+            for write in writes:
+                write.result()
+
+        # Write the SFZ file region by region rather than collecting every
+        # region in memory first
+        sfz_path = os.path.join(directory, "instrument.sfz")
+        with open(sfz_path, 'w') as sfz_file:
+            for i, (start, end) in enumerate(bounds):
+                # Add SFZ region, separated from the previous one by a newline
+                if i > 0:
+                    sfz_file.write("\n")
+                sfz_file.write(f"""
 <region>
-sample={segment_filename}
+sample=segment_{i+1}.wav
 pitch_keycenter={60 + i}
 lokey={60 + i}
 hikey={60 + i}
 """)
 
-            # Add to MIDI file
-            start_beat = start / sample_rate * beats_per_second
-            duration_beats = (end - start) / sample_rate * beats_per_second
-            midi.addNote(0, 0, 60 + i, start_beat, duration_beats, 100)
+                # Add to MIDI file
+                start_beat = start / sample_rate * beats_per_second
+                duration_beats = (end - start) / sample_rate * beats_per_second
+                midi.addNote(0, 0, 60 + i, start_beat, duration_beats, 100)
 
-            print(f"Debug: Segment {i+1}: start={start/sample_rate:.2f}s, duration={(end-start)/sample_rate:.2f}s, start_beat={start_beat:.2f}, duration_beats={duration_beats:.2f}")
+                print(f"Debug: Segment {i+1}: start={start/sample_rate:.2f}s, duration={(end-start)/sample_rate:.2f}s, start_beat={start_beat:.2f}, duration_beats={duration_beats:.2f}")
 
         # MIDI file debug information
         print("\nMIDI File Debug Information:")
@@ -81,11 +93,6 @@ hikey={60 + i}
         print(f"Total MIDI duration (seconds): {midi.total_time / beats_per_second:.2f}")
         print(f"Total number of segments: {len(segments) - 1}")
 
-        # Write SFZ file
-        sfz_path = os.path.join(directory, "instrument.sfz")
-        with open(sfz_path, 'w') as sfz_file:
-            sfz_file.write("\n".join(sfz_content))
-
         # Write MIDI file
         midi_path = os.path.join(directory, "sequence.mid")
         with open(midi_path, "wb") as midi_file:
@@ -1,10 +1,40 @@
+import logging
 import os
+import numpy as np
 import soundfile as sf
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal
 from audio_processor import WavAudioProcessor
 from midiutil import MIDIFile
 from math import ceil
 from export_utils import ExportUtils
 
+logger = logging.getLogger(__name__)
+
+class ExportWorker(QThread):
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, segments, audio_data, sample_rate, tempo, directory):
+        super().__init__()
+        self.segments = segments
+        self.audio_data = audio_data
+        self.sample_rate = sample_rate
+        self.tempo = tempo
+        self.directory = directory
+
+    def run(self):
+        try:
+            ExportUtils.export_segments(self.segments,
+                                        self.audio_data,
+                                        self.sample_rate,
+                                        self.tempo,
+                                        self.directory)
+        except Exception as e:
+            logger.exception("Export to %s failed", self.directory)
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(self.directory)
+
 class RcyController:
     def __init__(self, model):
         self.model = model
@@ -14,9 +44,18 @@ class RcyController:
         self.tempo = 120
         self.threshold = 0.20
         self.view = None
+        self.current_slices = None
+        self.export_worker = None
+        # Coalesce bursts of refresh requests (e.g. dragging the scroll bar)
+        # into at most one redraw per display frame
+        self.update_timer = QTimer()
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(16)
+        self.update_timer.timeout.connect(self.update_view)
 
     def set_view(self, view):
         self.view = view
+        self.view.set_peak(self.model.peak)
         self.view.bars_changed.connect(self.on_bars_changed)
         self.view.threshold_changed.connect(self.on_threshold_changed)
         self.view.remove_segment.connect(self.remove_segment)
@@ -28,39 +67,62 @@ class RcyController:
         self.split_audio(method='transients')
 
     def export_segments(self, directory):
-        return ExportUtils.export_segments(self.model,
-                                           self.tempo,
-                                           self.num_bars,
-                                           directory)
+        # Export on a worker thread so the UI stays responsive. The segment
+        # list is copied here, on the UI thread, since it may be edited while
+        # the export runs; the audio buffer is only ever replaced, not changed
+        self.export_worker = ExportWorker(list(self.model.get_segments()),
+                                          self.model.data,
+                                          self.model.sample_rate,
+                                          self.tempo,
+                                          directory)
+        self.export_worker.succeeded.connect(self.view.on_export_succeeded)
+        self.export_worker.failed.connect(self.view.on_export_failed)
+        self.export_worker.start()
+
+    def wait_for_export(self):
+        if self.export_worker is not None:
+            self.export_worker.wait()
 
     def load_audio_file(self, filename):
         self.model.set_filename(filename)
         self.tempo = self.model.get_tempo(self.num_bars)
+        self.view.set_peak(self.model.peak)
         self.update_view()
         self.view.update_scroll_bar(self.visible_time, self.model.total_time)
         self.view.update_tempo(self.tempo)
         return True
 
     def update_view(self):
-        start_time = self.view.get_scroll_position() * (self.model.total_time - self.visible_time) / 100
+        # A window wider than the file starts at 0; a negative start would
+        # make get_data slice from the tail of the audio
+        scrollable_time = max(self.model.total_time - self.visible_time, 0.0)
+        start_time = self.view.get_scroll_position() * scrollable_time / 100
         end_time = start_time + self.visible_time
         time, data = self.model.get_data(start_time, end_time)
         self.view.update_plot(time, data)
         slices = self.model.get_segments()
         self.view.update_slices(slices)
 
+    def schedule_update_view(self):
+        # update_view reads the scroll position when it runs, so requests
+        # arriving while the timer is pending are already covered
+        if not self.update_timer.isActive():
+            self.update_timer.start()
+
     def zoom_in(self):
+        # Repeated zooms only compound visible_time; the redraw is coalesced
+        # so a burst of them renders once, at the final zoom level
         self.visible_time *= 0.97
-        self.update_view()
         self.view.update_scroll_bar(self.visible_time,
                                     self.model.total_time)
+        self.schedule_update_view()
 
     def zoom_out(self):
         self.visible_time = min(self.visible_time * 1.03,
                                 self.model.total_time)
-        self.update_view()
         self.view.update_scroll_bar(self.visible_time,
                                     self.model.total_time)
+        self.schedule_update_view()
 
     def get_tempo(self):
         return self.tempo
@@ -84,12 +146,14 @@ class RcyController:
         self.view.update_slices(slices)
 
     def remove_segment(self, click_time):
+        # Editing segments leaves the visible waveform untouched; refresh
+        # only the slice overlay rather than refetching and replotting
         self.model.remove_segment(click_time)
-        self.update_view()
+        self.view.update_slices(self.model.get_segments())
 
     def add_segment(self, click_time):
         self.model.add_segment(click_time)
-        self.update_view()
+        self.view.update_slices(self.model.get_segments())
 
     def play_segment(self, click_time):
         start, end = self.model.get_segment_boundaries(click_time)
@@ -97,18 +161,18 @@ class RcyController:
             self.model.play_segment(start, end)
 
     def get_segment_boundaries(self, click_time):
-        if not hasattr(self, 'current_slices'):
+        if self.current_slices is None or len(self.current_slices) == 0:
             return None, None
-        for i, slice_time in enumerate(self.current_slices):
-            if click_time < slice_time:
-                if i == 0:
-                    return 0, slice_time
-                else:
-                    return self.current_slices[i-1], slice_time
-        return self.current_slices[-1], self.model.total_time
+        # Slices are sorted; find the first one after the click by bisection
+        i = int(np.searchsorted(self.current_slices, click_time, side='right'))
+        if i == 0:
+            return 0, float(self.current_slices[0])
+        if i == len(self.current_slices):
+            return float(self.current_slices[-1]), self.model.total_time
+        return float(self.current_slices[i-1]), float(self.current_slices[i])
 
     def handle_plot_click(self, click_time):
         start_time, end_time = self.get_segment_boundaries(click_time)
-        print(f"handle plot click {start_time} {end_time}")
+        logger.debug("handle plot click %s %s", start_time, end_time)
         if start_time is not None and end_time is not None:
             self.play_segment(start_time, end_time)
@@ -1,8 +1,15 @@
+import logging
+from functools import partial
+import numpy as np
 from PyQt6.QtWidgets import QApplication, QLabel, QLineEdit, QComboBox, QMessageBox, QMainWindow, QFileDialog, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QScrollBar ,QSlider
 from PyQt6.QtGui import QAction, QValidator, QIntValidator
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from downsample import peak_envelope, abs_peak
+
+logger = logging.getLogger(__name__)
 
 class RcyView(QMainWindow):
     bars_changed = pyqtSignal(int)
@@ -14,6 +21,16 @@ class RcyView(QMainWindow):
     def __init__(self, controller):
         super().__init__()
         self.controller = controller
+        # Plot click actions keyed by the Meta/Alt modifier bits; Meta wins
+        # over Alt, and any other combination plays the segment
+        meta = Qt.KeyboardModifier.MetaModifier
+        alt = Qt.KeyboardModifier.AltModifier
+        self.click_modifier_mask = meta | alt
+        self.click_actions = {
+            meta: self.remove_segment.emit,
+            meta | alt: self.remove_segment.emit,
+            alt: self.add_segment.emit,
+        }
         self.init_ui()
         self.create_menu_bar()
 
@@ -36,6 +53,7 @@ class RcyView(QMainWindow):
         export_action.setStatusTip('Export segments and SFZ file')
         export_action.triggered.connect(self.export_segments)
         file_menu.addAction(export_action)
+        self.export_action = export_action
 
         # Save As action
         save_as_action = QAction('Save As', self)
@@ -46,8 +64,27 @@ class RcyView(QMainWindow):
         directory = QFileDialog.getExistingDirectory(self,
                                                      "Select Export Directory")
         if directory:
+            # One export at a time; re-enabled when the export completes
+            self.export_action.setEnabled(False)
             self.controller.export_segments(directory)
 
+    def on_export_succeeded(self, directory):
+        self.export_action.setEnabled(True)
+        QMessageBox.information(self,
+                                "Export",
+                                f"Exported segments to {directory}.")
+
+    def on_export_failed(self, message):
+        self.export_action.setEnabled(True)
+        QMessageBox.critical(self,
+                             "Error",
+                             f"Failed to export segments: {message}")
+
+    def closeEvent(self, event):
+        # Let a running export finish writing its files before exiting
+        self.controller.wait_for_export()
+        super().closeEvent(event)
+
     def save_as(self):
         # Implement save as functionality
         pass
@@ -87,10 +124,10 @@ class RcyView(QMainWindow):
 
         ## add split buttons
         self.split_bars_button = QPushButton("Split by Bars")
-        self.split_bars_button.clicked.connect(lambda: self.controller.split_audio('bars'))
+        self.split_bars_button.clicked.connect(partial(self.controller.split_audio, method='bars'))
 
         self.split_transients_button = QPushButton("Split by Transients")
-        self.split_transients_button.clicked.connect(lambda: self.controller.split_audio('transients'))
+        self.split_transients_button.clicked.connect(partial(self.controller.split_audio, method='transients'))
 
         # Add bar resolution dropdown
         self.bar_resolution_combo = QComboBox()
@@ -125,6 +162,14 @@ class RcyView(QMainWindow):
         self.threshold_value_label = QLabel("0.10")
         threshold_layout.addWidget(self.threshold_value_label)
 
+        # Transient detection is expensive: while the slider is being dragged
+        # only the label follows it, and the threshold is emitted once the
+        # value has settled
+        self.threshold_timer = QTimer()
+        self.threshold_timer.setSingleShot(True)
+        self.threshold_timer.setInterval(100)
+        self.threshold_timer.timeout.connect(self.emit_threshold)
+
         # Add the slider layout to your main layout
         main_layout.addLayout(threshold_layout)
 
@@ -133,6 +178,29 @@ class RcyView(QMainWindow):
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
         self.line, = self.ax.plot([], [])
+        # The envelope is a dense run of near-vertical strokes; antialiasing
+        # it costs a coverage pass per segment for no visible gain
+        self.line.set_antialiased(False)
+        # All slice lines live in a single collection; x is in data
+        # coordinates and y spans the full axes height, like axvline
+        self.slice_lines = LineCollection([],
+                                          colors='r',
+                                          linestyles='--',
+                                          alpha=0.5,
+                                          transform=self.ax.get_xaxis_transform())
+        self.ax.add_collection(self.slice_lines, autolim=False)
+        # Slice lines are an animated overlay: a full draw caches the
+        # waveform as a background, and slice-only changes blit over it
+        self.slice_lines.set_animated(True)
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('resize_event', self.on_resize)
+        self.visible_slice_times = None
+        self.peak = None
+        self.plot_fingerprint = None
+        # update_plot sets both limits explicitly; keep matplotlib from
+        # rescanning artist data to autoscale on draw
+        self.ax.set_autoscale_on(False)
         self.ax.set_xlabel('')
         self.ax.tick_params(axis='x',
                             which='both',
@@ -143,7 +211,7 @@ class RcyView(QMainWindow):
 
         # Create scroll bar
         self.scroll_bar = QScrollBar(Qt.Orientation.Horizontal)
-        self.scroll_bar.valueChanged.connect(self.controller.update_view)
+        self.scroll_bar.valueChanged.connect(self.controller.schedule_update_view)
         main_layout.addWidget(self.scroll_bar)
 
         # Create buttons
@@ -157,38 +225,74 @@ class RcyView(QMainWindow):
         main_layout.addLayout(button_layout)
 
     def on_plot_click(self, event):
-        print("on_plot_click")
+        logger.debug("on_plot_click")
         if event.inaxes != self.ax:
             return
 
-        modifiers = QApplication.keyboardModifiers()
-        print(f"    {modifiers}")
-        print(f"    {event.modifiers}")
-        if modifiers & Qt.KeyboardModifier.MetaModifier:
-            self.remove_segment.emit(event.xdata)
-        elif modifiers & Qt.KeyboardModifier.AltModifier:
-            self.add_segment.emit(event.xdata)
+        # Read the modifiers carried by the Qt mouse event rather than
+        # querying global keyboard state; synthetic events have no guiEvent
+        if event.guiEvent is not None:
+            modifiers = event.guiEvent.modifiers()
         else:
-            self.play_segment.emit(event.xdata)
+            modifiers = QApplication.keyboardModifiers()
+        logger.debug("    %s", modifiers)
+        logger.debug("    %s", event.modifiers)
+        action = self.click_actions.get(modifiers & self.click_modifier_mask,
+                                        self.play_segment.emit)
+        action(event.xdata)
 
     def on_threshold_changed(self, value):
         threshold = value / 100.0
         self.threshold_value_label.setText(f"{threshold:.2f}")
-        self.threshold_changed.emit(threshold)
+        # Restarting the timer defers the emit to the trailing edge
+        self.threshold_timer.start()
+
+    def emit_threshold(self):
+        self.threshold_changed.emit(self.threshold_slider.value() / 100.0)
 
     def update_slices(self, slices):
-        print("Convert slice points to times")
-        slice_times = [slice_point / self.controller.model.sample_rate for slice_point in slices]
-        # Clear previous slice lines
-        for line in self.ax.lines[1:]:
-            line.remove()
-        # Plot new slice lines
-        for slice_time in slice_times:
-            self.ax.axvline(x=slice_time, color='r', linestyle='--', alpha=0.5)
-        self.canvas.draw()
+        # Convert all slice points to times in one vectorized division
+        slice_times = np.asarray(slices, dtype=np.float64) / self.controller.model.sample_rate
         # Store the current slices in the controller
         self.controller.current_slices = slice_times
-        print(f"Debugging: Updated current_slices in controller: {self.controller.current_slices}")
+        logger.debug("Updated current_slices in controller: %s", slice_times)
+        # Only slices inside the visible window are drawn; slices are sorted,
+        # so the window's range is found by binary search
+        start_time, end_time = self.ax.get_xlim()
+        first = np.searchsorted(slice_times, start_time, side='left')
+        last = np.searchsorted(slice_times, end_time, side='right')
+        visible_times = slice_times[first:last]
+        # Scrolling and zooming often leave the visible slices unchanged; the
+        # lines already on the axes are still valid, so skip the redraw
+        if self.visible_slice_times is not None and np.array_equal(visible_times, self.visible_slice_times):
+            return
+        self.visible_slice_times = visible_times
+        # Replace all slice lines in one artist update, building the
+        # (n, 2, 2) vertex array with NumPy rather than nested lists
+        segments = np.zeros((len(visible_times), 2, 2))
+        segments[:, :, 0] = visible_times[:, np.newaxis]
+        segments[:, 1, 1] = 1
+        self.slice_lines.set_segments(segments)
+        self.blit_slices()
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.slice_lines)
+
+    def on_resize(self, event):
+        # The envelope has one bucket per pixel column; rebuild it at the
+        # new width even if the window itself is unchanged
+        self.plot_fingerprint = None
+        self.controller.schedule_update_view()
+
+    def blit_slices(self):
+        if self.background is None:
+            if self.canvas.isVisible():
+                self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.slice_lines)
+        self.canvas.blit(self.ax.bbox)
 
     def on_bars_changed(self):
         text = self.bars_input.text()
@@ -197,19 +301,55 @@ class RcyView(QMainWindow):
 
         if state == QValidator.State.Acceptable:
             num_bars = int(text)
-            self.bars_changed.emit(num_bars)
+            # editingFinished also fires on focus loss; only notify the
+            # controller when the value actually changed
+            if num_bars != self.controller.num_bars:
+                self.bars_changed.emit(num_bars)
         else:
-            self.bars_input.setText(str(getattr(self.controller,
-                                                'num_bars', 1)))
+            self.bars_input.setText(str(self.controller.num_bars))
 
     def update_tempo(self, tempo):
         self.tempo_display.setText(f"{tempo:.2f} BPM")
 
+    def set_peak(self, peak):
+        # Called when new audio is loaded, which may reuse the old buffer
+        self.peak = peak
+        self.plot_fingerprint = None
+
     def update_plot(self, time, data):
-        self.line.set_data(time, data)
-        self.ax.set_xlim(time[0], time[-1])
-        self.ax.set_ylim(min(data), max(data))
-        self.canvas.draw()
+        # Nothing to plot (e.g. the window lies past the end of the audio)
+        if len(time) == 0:
+            return
+        # Only one bucket per horizontal pixel can be seen, so draw the
+        # M4 envelope instead of handing matplotlib every sample
+        num_buckets = max(int(self.ax.bbox.width), 1)
+        start_time, end_time = float(time[0]), float(time[-1])
+        # A zoom_out already clamped to the file length, or scrolling a file
+        # shorter than the visible window, re-sends the same window of the
+        # same buffer; skip the envelope and the full redraw in that case
+        fingerprint = (data.__array_interface__['data'][0], len(data),
+                       start_time, end_time, num_buckets)
+        if fingerprint == self.plot_fingerprint:
+            return
+        self.plot_fingerprint = fingerprint
+        self.line.set_data(*peak_envelope(time, data, num_buckets))
+        # Setting limits invalidates the axes transforms and ticks even when
+        # the values are unchanged, so only set the ones that moved
+        if (start_time, end_time) != self.ax.get_xlim():
+            self.ax.set_xlim(start_time, end_time)
+        # Use the file's peak for symmetric y-limits so the visible window is
+        # never rescanned; scan the window only if it is unknown
+        peak = self.peak if self.peak is not None else abs_peak(data)
+        peak = peak or 1.0
+        if (-peak, peak) != self.ax.get_ylim():
+            self.ax.set_ylim(-peak, peak)
+        # The cached background shows the old waveform, so slices must not be
+        # blitted onto it; they are drawn by the pending repaint instead.
+        # draw_idle lets a burst of updates share a single render
+        self.background = None
+        # Until the window is shown, its first resize will draw anyway
+        if self.canvas.isVisible():
+            self.canvas.draw_idle()
 
     def update_scroll_bar(self, visible_time, total_time):
         proportion = visible_time / total_time